@@ -1,9 +1,77 @@
 import os
+import re
+import hashlib
+import shelve
 import chromadb
-from typing import List, Dict, Any
+from functools import lru_cache
+import numpy as np
+import torch
+from typing import List, Dict, Any, Sequence
 from sentence_transformers import SentenceTransformer
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+# Paragraph, line and sentence boundaries used by fast_chunk
+_FAST_SEP = re.compile(r"\n\n|\n|(?<=[.!?]) ")
+
+# Word boundaries used by fast_chunk for segments longer than a chunk
+_WORD_SEP = re.compile(r" +")
+
+# Texts shorter than this are chunked with fast_chunk
+FAST_CHUNK_MAX_LENGTH = 20000
+
+def fast_chunk(text: str, chunk_size: int = 500, chunk_overlap: int = 200) -> List[str]:
+    """
+    Split small texts into overlapping chunks on paragraph, line and sentence boundaries.
+
+    Args:
+        text: Input text to chunk
+        chunk_size: Maximum number of characters per chunk
+        chunk_overlap: Maximum number of overlapping characters between chunks
+
+    Returns:
+        List of text chunks
+    """
+    # Segment boundaries; over-long segments fall back to word boundaries,
+    # and only single words longer than chunk_size are cut mid-word
+    bounds = [0] + [m.end() for m in _FAST_SEP.finditer(text)] + [len(text)]
+    cuts = []
+    for start, end in zip(bounds, bounds[1:]):
+        if end - start <= chunk_size:
+            cuts.append(start)
+            continue
+        words = [start] + [
+            m.end() for m in _WORD_SEP.finditer(text, start, end) if m.end() < end
+        ]
+        for word_start, word_end in zip(words, words[1:] + [end]):
+            cuts.extend(range(word_start, word_end, chunk_size))
+    cuts.append(len(text))
+
+    chunks = []
+    n = len(cuts) - 1
+    i = 0
+    while i < n:
+        # Greedily pack whole segments up to chunk_size characters
+        j = i + 1
+        while j < n and cuts[j + 1] - cuts[i] <= chunk_size:
+            j += 1
+        chunk = text[cuts[i]:cuts[j]].strip()
+        if chunk:
+            chunks.append(chunk)
+        if j >= n:
+            break
+
+        # Step back over trailing segments that fit in the overlap window,
+        # leaving room for the next segment in the following chunk
+        k = j
+        while (
+            k - 1 > i
+            and cuts[j] - cuts[k - 1] <= chunk_overlap
+            and cuts[j + 1] - cuts[k - 1] <= chunk_size
+        ):
+            k -= 1
+        i = k
+    return chunks
+
 class VectorDB:
     """
     A simple vector database wrapper using ChromaDB with HuggingFace embeddings.
@@ -24,37 +92,79 @@ class VectorDB:
             "EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
         )
 
+        self.batch_size = 5000
+
+        # On-disk cache of chunk embeddings keyed by content hash
+        self.embedding_cache_path = "./emb_cache.db"
+
         # Initialize ChromaDB client
         self.client = chromadb.PersistentClient(path="./chroma_db")
 
-        # Load embedding model
-        print(f"Loading embedding model: {self.embedding_model_name}")
-        self.embedding_model = SentenceTransformer(self.embedding_model_name)
+        # Load embedding model (fp16 on GPU for faster batched encoding)
+        self.onnx_file = None
+        if os.getenv("USE_ONNX"):
+            # Quantized ONNX Runtime backend for faster CPU inference
+            self.device = "cpu"
+            self.onnx_file = os.getenv("ONNX_MODEL_FILE", "onnx/model_qint8_avx512.onnx")
+            print(f"Loading embedding model: {self.embedding_model_name} (onnx: {self.onnx_file})")
+            self.embedding_model = SentenceTransformer(
+                self.embedding_model_name,
+                device=self.device,
+                backend="onnx",
+                model_kwargs={"file_name": self.onnx_file},
+            )
+        else:
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            print(f"Loading embedding model: {self.embedding_model_name} ({self.device})")
+            self.embedding_model = SentenceTransformer(self.embedding_model_name, device=self.device)
+            if self.device == "cuda":
+                self.embedding_model.half()
+
+        # Identifies which model/backend produced an embedding; stored with each chunk
+        if self.onnx_file:
+            backend = f"onnx:{self.onnx_file}"
+        else:
+            backend = "torch:fp16" if self.device == "cuda" else "torch:fp32"
+        self.embedding_signature = f"{self.embedding_model_name}|{backend}"
+
+        # Reusable text splitter for chunking documents
+        self._splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=200)
+
+        # Per-instance cache of query embeddings keyed on the normalized query
+        self._embed_query = lru_cache(maxsize=1024)(self._encode_query)
 
         # Get or create collection
         self.collection = self.client.get_or_create_collection(
             name=self.collection_name,
-            metadata={"description": "RAG document collection"},
+            # Embeddings are L2-normalized, so inner product equals cosine similarity
+            metadata={"description": "RAG document collection", "hnsw:space": "ip"},
         )
 
         print(f"Vector database initialized with collection: {self.collection_name}")
 
     def chunk_text(self, text: str, chunk_size: int = 500, chunk_overlap: int = 200) -> List[str]:
         """
-        Simple text chunking by splitting on spaces and grouping into chunks.
+        Split text into overlapping chunks on paragraph, line, sentence and word boundaries.
 
         Args:
             text: Input text to chunk
             chunk_size: Approximate number of characters per chunk
+            chunk_overlap: Number of overlapping characters between chunks
 
         Returns:
             List of text chunks
         """
-        splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap
-        )
-        chunks = splitter.split_text(text)
+        if len(text) < FAST_CHUNK_MAX_LENGTH:
+            chunks = fast_chunk(text, chunk_size, chunk_overlap)
+            print(f"Text chunked into {len(chunks)} chunks.")
+            return chunks
+
+        if (self._splitter._chunk_size, self._splitter._chunk_overlap) != (chunk_size, chunk_overlap):
+            self._splitter = RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap
+            )
+        chunks = self._splitter.split_text(text)
         print(f"Text chunked into {len(chunks)} chunks.")
         return chunks
 
@@ -72,7 +182,7 @@ class VectorDB:
 
         for doc_idx, doc in enumerate(documents):
             content = doc.get("content", "")
-            metadata = doc.get("metadata", {})
+            metadata = {**doc.get("metadata", {}), "embedding": self.embedding_signature}
             chunks = self.chunk_text(content)
 
             for chunk_idx, chunk in enumerate(chunks):
@@ -81,48 +191,124 @@ class VectorDB:
                 all_metadatas.append(metadata)
                 all_ids.append(chunk_id)
 
-        embeddings = self.embedding_model.encode(all_chunks)
+        # Skip chunks already stored with the same text, metadata and embedding backend
+        existing = self.collection.get(ids=all_ids, include=["documents", "metadatas"])
+        stored = {
+            chunk_id: (document, metadata)
+            for chunk_id, document, metadata in zip(
+                existing["ids"], existing["documents"], existing["metadatas"]
+            )
+        }
+        pending = [
+            i for i, chunk_id in enumerate(all_ids)
+            if stored.get(chunk_id) != (all_chunks[i], all_metadatas[i])
+        ]
+        if not pending:
+            print("All documents already up to date in vector database")
+            return
+        all_chunks = [all_chunks[i] for i in pending]
+        all_metadatas = [all_metadatas[i] for i in pending]
+        all_ids = [all_ids[i] for i in pending]
+
+        # Embed each distinct chunk only once; duplicates reuse the same vector
+        seen: Dict[str, int] = {}
+        unique_chunks = []
+        unique_hashes = []
+        idx_map = []
+        for chunk in all_chunks:
+            h = hashlib.sha1(chunk.encode("utf-8")).hexdigest()
+            if h not in seen:
+                seen[h] = len(unique_chunks)
+                unique_chunks.append(chunk)
+                unique_hashes.append(h)
+            idx_map.append(seen[h])
+
+        with shelve.open(self.embedding_cache_path) as cache:
+            # Only encode chunks whose embedding is not cached from a previous run
+            keys = [f"{self.embedding_signature}:{h}" for h in unique_hashes]
+            misses = [i for i, key in enumerate(keys) if key not in cache]
+            print(
+                f"Embedding {len(misses)} new chunks "
+                f"({len(unique_chunks)} unique out of {len(all_chunks)})"
+            )
 
-        self.collection.add(
-            documents=all_chunks,
-            embeddings=embeddings,
-            metadatas=all_metadatas,
-            ids=all_ids,
+            if misses:
+                new_embeddings = self.embedding_model.encode(
+                    [unique_chunks[i] for i in misses],
+                    batch_size=128,
+                    show_progress_bar=False,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                )
+                for i, embedding in zip(misses, new_embeddings):
+                    cache[keys[i]] = np.asarray(embedding, dtype=np.float32)
+
+            unique_embeddings = np.stack([cache[key] for key in keys])
+
+        embeddings = np.ascontiguousarray(
+            unique_embeddings[np.asarray(idx_map, dtype=np.intp)], dtype=np.float32
         )
+
+        # Upsert in batches to bound client-side memory on large corpora
+        for i in range(0, len(all_chunks), self.batch_size):
+            self.collection.upsert(
+                documents=all_chunks[i:i + self.batch_size],
+                embeddings=embeddings[i:i + self.batch_size],
+                metadatas=all_metadatas[i:i + self.batch_size],
+                ids=all_ids[i:i + self.batch_size],
+            )
         print("Documents added to vector database")
 
-    def search(self, query: str, n_results: int = 5) -> Dict[str, Any]:
+    def _encode_query(self, query: str) -> tuple:
+        """
+        Encode a single query into a hashable embedding.
+
+        Args:
+            query: Normalized search query
+
+        Returns:
+            Query embedding as a tuple of floats
+        """
+        embedding = self.embedding_model.encode([query], normalize_embeddings=True)[0]
+        return tuple(embedding.tolist())
+
+    def search(
+        self, query: str, n_results: int = 5, include: Sequence[str] = ("documents",)
+    ) -> Dict[str, Any]:
         """
         Search for similar documents in the vector database.
 
         Args:
             query: Search query
             n_results: Number of results to return
+            include: Fields to fetch from ChromaDB ('documents', 'metadatas', 'distances')
 
         Returns:
-            Dictionary containing search results with keys: 'documents', 'metadatas', 'distances', 'ids'
+            Dictionary containing search results with keys: 'documents', 'metadatas', 'distances'.
+            Fields not listed in include are returned as empty lists.
         """
-        # Encode the query to get its embedding
-        query_embedding = self.embedding_model.encode([query])[0]
+        # Encode the query to get its embedding (cached for repeated queries)
+        query_embedding = np.asarray(
+            self._embed_query(query.strip().lower()), dtype=np.float32
+        )
 
-        # Perform similarity search in ChromaDB
+        # Perform similarity search in ChromaDB, fetching only the requested fields
         results = self.collection.query(
             query_embeddings=[query_embedding],
             n_results=n_results,
-            include=["documents", "metadatas", "distances"]
+            include=list(include)
         )
 
         # Handle the case where results might be empty
-        if not results or not results.get("documents"):
+        if not results or not results.get("ids") or not results["ids"][0]:
             return {
                 "documents": [],
                 "metadatas": [],
                 "distances": [],
-            }            
+            }
 
         return {
-            "documents": results.get("documents", [])[0],
-            "metadatas": results.get("metadatas", [])[0],
-            "distances": results.get("distances", [])[0],
-        }    
-        
\ No newline at end of file
+            "documents": (results.get("documents") or [[]])[0],
+            "metadatas": (results.get("metadatas") or [[]])[0],
+            "distances": (results.get("distances") or [[]])[0],
+        }
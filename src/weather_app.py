@@ -1,5 +1,10 @@
 import os
-from typing import List
+import mmap
+import hashlib
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterator, List
 from dotenv import load_dotenv
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
@@ -12,6 +17,24 @@ from pathlib import Path
 # Load environment variables
 load_dotenv()
 
+@lru_cache(maxsize=256)
+def _load_weather_text(file_path: Path, mtime_ns: int) -> str:
+    """
+    Read a weather file once per modification via a memory map.
+
+    Args:
+        file_path: Path to the weather file
+        mtime_ns: Modification time of the file, so updated forecasts are re-read
+
+    Returns:
+        Contents of the weather file
+    """
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return bytes(mm).decode("utf-8")
+
 def get_weather_data(country: str) -> str:
     """
     Get weather data directly from the country's weather file.
@@ -27,8 +50,7 @@ def get_weather_data(country: str) -> str:
     
     try:
         if file_path.exists():
-            with open(file_path, "r", encoding="utf-8") as f:
-                return f.read()
+            return _load_weather_text(file_path, file_path.stat().st_mtime_ns)
         else:
             print(f"No weather data found for {country}")
             return None
@@ -73,6 +95,21 @@ class RAGAssistant:
         # Create the chain
         self.chain = self.prompt_template | self.llm | StrOutputParser()
 
+        # Cache generated advisories for repeated questions
+        self._cache = TTLCache(maxsize=512, ttl=3600)
+
+    @staticmethod
+    def _cache_key(country: str, weather_data: str) -> str:
+        """Build a cache key from the normalized country name and its weather data."""
+        h = hashlib.blake2b(country.strip().lower().encode())
+        h.update(b"\0")
+        h.update(weather_data.encode())
+        return h.hexdigest()
+
+    def clear_cache(self) -> None:
+        """Clear all cached advisories."""
+        self._cache.clear()
+
     def _initialize_llm(self):
         """
         Initialize the LLM by checking for available API keys.
@@ -83,14 +120,16 @@ class RAGAssistant:
             model_name = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
             print(f"Using OpenAI model: {model_name}")
             return ChatOpenAI(
-                api_key=os.getenv("OPENAI_API_KEY"), model=model_name, temperature=0.0
+                api_key=os.getenv("OPENAI_API_KEY"), model=model_name, temperature=0.0,
+                streaming=True,
             )
 
         elif os.getenv("GROQ_API_KEY"):
             model_name = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
             print(f"Using Groq model: {model_name}")
             return ChatGroq(
-                api_key=os.getenv("GROQ_API_KEY"), model=model_name, temperature=0.0
+                api_key=os.getenv("GROQ_API_KEY"), model=model_name, temperature=0.0,
+                streaming=True,
             )
 
         elif os.getenv("GOOGLE_API_KEY"):
@@ -107,33 +146,105 @@ class RAGAssistant:
                 "No valid API key found. Please set one of: OPENAI_API_KEY, GROQ_API_KEY, or GOOGLE_API_KEY in your .env file"
             )
 
-    def invoke(self, country: str) -> str:
+    def stream(self, country: str) -> Iterator[str]:
         """
-        Generate weather advisory for a specific country.
+        Generate weather advisory for a specific country, chunk by chunk.
 
         Args:
             country: Name of the country
 
-        Returns:
-            Weather analysis and recommendations
+        Yields:
+            Pieces of the weather analysis as they are generated
         """
         try:
             weather_data = get_weather_data(country)
             
             if not weather_data:
-                return f"No weather data available for {country}"
+                yield f"No weather data available for {country}"
+                return
+
+            # Keyed on the weather data too, so updated forecasts are not served stale
+            key = self._cache_key(country, weather_data)
+            cached = self._cache.get(key)
+            if cached is not None:
+                yield cached
+                return
             
-            # Generate analysis using the chain
-            result = self.chain.invoke({
+            # Generate analysis using the chain, passing tokens on as they arrive
+            parts = []
+            for chunk in self.chain.stream({
                 "country": country,
                 "weather_data": weather_data
-            })
+            }):
+                parts.append(chunk)
+                yield chunk
             
-            return result
+            self._cache[key] = "".join(parts)
 
         except Exception as e:
             print(f"Error generating weather advisory: {str(e)}")
-            return "I encountered an error while processing your request."
+            yield "I encountered an error while processing your request."
+
+    def invoke(self, country: str) -> str:
+        """
+        Generate weather advisory for a specific country.
+
+        Args:
+            country: Name of the country
+
+        Returns:
+            Weather analysis and recommendations
+        """
+        return "".join(self.stream(country))
+
+    def invoke_batch(self, countries: List[str]) -> Dict[str, str]:
+        """
+        Generate weather advisories for several countries in one batch.
+
+        Args:
+            countries: Names of the countries
+
+        Returns:
+            Dictionary mapping each country to its weather analysis
+        """
+        if not countries:
+            return {}
+
+        # Answer each country once, however often it appears in the batch
+        unique = {}
+        for country in countries:
+            unique.setdefault(country.strip().lower(), country)
+        names = list(unique.values())
+
+        # Read weather data for all countries concurrently
+        with ThreadPoolExecutor(max_workers=min(32, len(names))) as ex:
+            weather_data = list(ex.map(get_weather_data, names))
+
+        results = {}
+        inputs = []
+        for country, data in zip(names, weather_data):
+            if not data:
+                results[country] = f"No weather data available for {country}"
+                continue
+            cached = self._cache.get(self._cache_key(country, data))
+            if cached is not None:
+                results[country] = cached
+            else:
+                inputs.append({"country": country, "weather_data": data})
+
+        if inputs:
+            outputs = self.chain.batch(
+                inputs, config={"max_concurrency": 8}, return_exceptions=True
+            )
+            for item, output in zip(inputs, outputs):
+                if isinstance(output, Exception):
+                    print(f"Error generating weather advisory for {item['country']}: {str(output)}")
+                    output = "I encountered an error while processing your request."
+                else:
+                    self._cache[self._cache_key(item["country"], item["weather_data"])] = output
+                results[item["country"]] = output
+
+        return {country: results[unique[country.strip().lower()]] for country in countries}
 
 def main():
     """Main function to demonstrate the weather advisory assistant."""
@@ -142,14 +253,38 @@ def main():
         assistant = RAGAssistant()
 
         while True:
-            country = input("\nEnter a country name or 'quit' to exit: ").strip()
+            country = input("\nEnter a country name, 'batch <file>', 'clear' to reset the cache or 'quit' to exit: ").strip()
             
             if country.lower() == 'quit':
                 break
+
+            if country.lower() == 'clear':
+                assistant.clear_cache()
+                print("Cache cleared.")
+                continue
+
+            if country.lower().startswith('batch '):
+                # Answer every country listed (one per line) in the given file
+                batch_file = Path(country[len('batch '):].strip())
+                try:
+                    countries = [
+                        line.strip()
+                        for line in batch_file.read_text(encoding="utf-8").splitlines()
+                        if line.strip()
+                    ]
+                except OSError as e:
+                    print(f"Error reading batch file {batch_file}: {e}")
+                    continue
+
+                print(f"\nGenerating weather advisories for {len(countries)} countries...")
+                for result in assistant.invoke_batch(countries).values():
+                    print("\n" + result)
+                continue
             
-            print("\nGenerating weather advisory...")
-            result = assistant.invoke(country)
-            print("\n" + result)
+            print("\nGenerating weather advisory...\n")
+            for chunk in assistant.stream(country):
+                print(chunk, end="", flush=True)
+            print()
 
     except Exception as e:
         print(f"Error running Weather Advisory Assistant: {e}")
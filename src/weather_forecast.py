@@ -1,8 +1,15 @@
 import os
+import csv
+import json
+import sqlite3
+import asyncio
+import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 from geopy.geocoders import Nominatim
 
@@ -14,38 +21,87 @@ class WeatherForecast:
             raise ValueError("Please set OPENWEATHER_API_KEY in .env file")
         
         self.base_url = "https://api.openweathermap.org/data/2.5/weather"
+        self.max_concurrency = 20  # Stay within OpenWeather's rate limit
         self.data_dir = Path(__file__).parent.parent / "data" / "weather"
         self.geolocator = Nominatim(user_agent="weather_forecast")
         
         # Create weather data directory
         self.data_dir.mkdir(parents=True, exist_ok=True)
 
+        # Load bundled capital coordinates so most lookups never hit the network
+        self.countries_path = self.data_dir.parent / "countries.csv"
+        self._country_coords = self._load_country_coords()
+
+        # Load cached geocoding results from previous runs
+        self.geo_cache_path = self.data_dir.parent / "geo_cache.json"
+        self._geo_cache = self._load_geo_cache()
+
+        # Cache of OpenWeather responses for conditional GETs
+        self.response_cache_path = self.data_dir.parent / "weather_cache.sqlite"
+        self._response_cache = sqlite3.connect(self.response_cache_path, check_same_thread=False)
+        self._response_cache.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                lat REAL, lon REAL, etag TEXT, last_modified TEXT, body TEXT,
+                PRIMARY KEY (lat, lon)
+            )"""
+        )
+
+        # Reuse one pooled keep-alive HTTP session across requests
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=self.max_concurrency,
+            pool_maxsize=self.max_concurrency,
+            max_retries=Retry(total=3, backoff_factor=0.2),
+        ))
+
+    def _load_geo_cache(self) -> Dict:
+        """Load cached coordinates from disk."""
+        if not self.geo_cache_path.exists():
+            return {}
+        try:
+            with open(self.geo_cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading geocoding cache: {e}")
+            return {}
+
+    def _load_country_coords(self) -> Dict[str, tuple]:
+        """Load capital coordinates for each country from the bundled CSV."""
+        if not self.countries_path.exists():
+            return {}
+        try:
+            with open(self.countries_path, 'r', encoding='utf-8', newline='') as f:
+                return {
+                    row['name'].lower(): (float(row['latitude']), float(row['longitude']))
+                    for row in csv.DictReader(f)
+                }
+        except Exception as e:
+            print(f"Error loading country coordinates: {e}")
+            return {}
+
+    def _save_geo_cache(self):
+        """Persist cached coordinates to disk."""
+        try:
+            with open(self.geo_cache_path, 'w', encoding='utf-8') as f:
+                json.dump(self._geo_cache, f, indent=2, sort_keys=True)
+        except Exception as e:
+            print(f"Error saving geocoding cache: {e}")
+
     def get_coordinates(self, location: str) -> tuple:
         """Get latitude and longitude for a location."""
         try:
-            # Special handling for Canada
-            if location.lower() == "canada":
-                # Using Ottawa (capital) coordinates as default for Canada
-                return 45.4215, -75.6972
-            
-            # Special handling for Brazil
-            if location.lower() == "brazil":
-                # Using Brasilia (capital) coordinates as default for Brazil
-                return -15.7801, -47.9292
-            
-            # Special handling for Niger
-            if location.lower() == "niger":
-                # Using Niamey (capital) coordinates as default for Niger
-                return 13.5137, 2.1098
+            coords = self._country_coords.get(location.lower())
+            if coords:
+                return coords
 
-            # Special handling for Palau
-            if location.lower() == "palau":
-                # Using Ngerulmud (capital) coordinates as default for Palau
-                return 7.5000, 134.6241
+            cached = self._geo_cache.get(location.lower())
+            if cached:
+                return tuple(cached)
 
             loc = self.geolocator.geocode(location, timeout=10)
             if loc:
                 print(f"Found coordinates for {location}: {loc.latitude}, {loc.longitude}")
+                self._geo_cache[location.lower()] = [loc.latitude, loc.longitude]
                 return loc.latitude, loc.longitude
             
             print(f"Could not find coordinates for {location}")
@@ -54,19 +110,69 @@ class WeatherForecast:
             print(f"Error getting coordinates for {location}: {e}")
             return None
 
-    def get_weather(self, lat: float, lon: float) -> Dict:
-        """Fetch weather data for given coordinates."""
-        params = {
+    def _params(self, lat: float, lon: float) -> Dict:
+        """Build OpenWeather query parameters for given coordinates."""
+        return {
             'lat': lat,
             'lon': lon,
             'appid': self.api_key,
             'units': 'metric'  # For Celsius
         }
+
+    def _cached_response(self, lat: float, lon: float) -> Tuple[Dict, Optional[Dict]]:
+        """Build conditional request headers and return the cached body, if any."""
+        row = self._response_cache.execute(
+            "SELECT etag, last_modified, body FROM responses WHERE lat = ? AND lon = ?",
+            (lat, lon),
+        ).fetchone()
+        if not row:
+            return {}, None
+
+        etag, last_modified, body = row
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers, json.loads(body)
+
+    def _response_row(self, lat: float, lon: float, headers, body: Dict) -> Optional[tuple]:
+        """Build a cache row for a response, or None if it has no validators."""
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return None
+        return (lat, lon, etag, last_modified, json.dumps(body))
+
+    def _store_responses(self, rows: List[tuple]):
+        """Remember response bodies together with their validators in one transaction."""
+        if not rows:
+            return
+        with self._response_cache:
+            self._response_cache.executemany(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def close(self):
+        """Close the HTTP session and the response cache."""
+        self.session.close()
+        self._response_cache.close()
+
+    def get_weather(self, lat: float, lon: float) -> Dict:
+        """Fetch weather data for given coordinates."""
+        params = self._params(lat, lon)
+        headers, cached = self._cached_response(lat, lon)
         
         try:
-            response = requests.get(self.base_url, params=params)
+            response = self.session.get(self.base_url, params=params, headers=headers)
+            if response.status_code == 304 and cached is not None:
+                return cached
             response.raise_for_status()
-            return response.json()
+            weather_data = response.json()
+            row = self._response_row(lat, lon, response.headers, weather_data)
+            if row:
+                self._store_responses([row])
+            return weather_data
         except requests.RequestException as e:
             print(f"Error fetching weather data: {e}")
             return None
@@ -96,18 +202,78 @@ Wind Speed: {weather_data['wind']['speed']} m/s
         except Exception as e:
             print(f"Error saving forecast for {country}: {e}")
 
+    async def _fetch(
+        self,
+        session: aiohttp.ClientSession,
+        lat: float,
+        lon: float,
+        cached_response: Tuple[Dict, Optional[Dict]],
+        new_rows: List[tuple],
+    ) -> Dict:
+        """Fetch weather data for given coordinates asynchronously."""
+        headers, cached = cached_response
+        try:
+            async with session.get(
+                self.base_url, params=self._params(lat, lon), headers=headers
+            ) as response:
+                if response.status == 304 and cached is not None:
+                    return cached
+                response.raise_for_status()
+                weather_data = await response.json()
+                row = self._response_row(lat, lon, response.headers, weather_data)
+                if row:
+                    new_rows.append(row)
+                return weather_data
+        except aiohttp.ClientError as e:
+            print(f"Error fetching weather data: {e}")
+            return None
+
+    async def _gather(
+        self, coords: Dict[str, tuple], cached_responses: Dict[tuple, Tuple[Dict, Optional[Dict]]]
+    ) -> List[tuple]:
+        """Fetch and save forecasts for all countries with bounded concurrency."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        # New cache rows are returned to the caller so no database I/O runs on the event loop
+        new_rows = []
+
+        async def process(session: aiohttp.ClientSession, country: str, lat: float, lon: float):
+            async with semaphore:
+                weather_data = await self._fetch(
+                    session, lat, lon, cached_responses[(lat, lon)], new_rows
+                )
+            if weather_data:
+                formatted_data = self.format_weather_data(weather_data)
+                await asyncio.to_thread(self.save_forecast, country, formatted_data)
+
+        async with aiohttp.ClientSession() as session:
+            results = await asyncio.gather(
+                *(process(session, country, *c) for country, c in coords.items()),
+                return_exceptions=True,
+            )
+
+        for country, result in zip(coords, results):
+            if isinstance(result, Exception):
+                print(f"Error processing {country}: {result}")
+
+        return new_rows
+
     def update_all_forecasts(self, countries: List[str]):
         """Update weather forecasts for all specified countries."""
+        # Resolve coordinates first; Nominatim's usage policy forbids parallel lookups
+        coords = {}
         for country in countries:
             print(f"\nProcessing {country}...")
-            coords = self.get_coordinates(country)
-            if coords:
-                weather_data = self.get_weather(*coords)
-                if weather_data:
-                    formatted_data = self.format_weather_data(weather_data)
-                    self.save_forecast(country, formatted_data)
+            location = self.get_coordinates(country)
+            if location:
+                coords[country] = location
             else:
                 print(f"Could not find coordinates for {country}")
+        self._save_geo_cache()
+
+        # Read cached responses up front and write new ones in a single transaction afterwards
+        cached_responses = {c: self._cached_response(*c) for c in set(coords.values())}
+        new_rows = asyncio.run(self._gather(coords, cached_responses))
+        self._store_responses(new_rows)
 
 def main():
     # List of countries to fetch weather for
@@ -146,7 +312,10 @@ def main():
 
     try:
         weather_service = WeatherForecast()
-        weather_service.update_all_forecasts(countries)
+        try:
+            weather_service.update_all_forecasts(countries)
+        finally:
+            weather_service.close()
         print("\nWeather forecast update completed!")
     except Exception as e:
         print(f"Error: {e}")